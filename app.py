@@ -1,10 +1,15 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 import re
 import os
 import json
+import time
+import atexit
+import threading
+import uuid
 
 app = Flask(__name__)
 
@@ -12,9 +17,80 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-me'
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///recipes.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['STATS_FLUSH_INTERVAL'] = int(os.environ.get('STATS_FLUSH_INTERVAL') or 30)  # секунды
 
 db = SQLAlchemy(app)
 
+# ========== СЕРИАЛИЗАЦИЯ JSON ==========
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен, без него работает стандартный json
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON-провайдер: orjson, если установлен, иначе стандартный json"""
+    sort_keys = False
+    ensure_ascii = False
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        
+        obj = self._prepare_response_obj(args, kwargs)
+        option = orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option),
+            mimetype=self.mimetype
+        )
+
+app.json = FastJSONProvider(app)
+
+def parse_ingredients(text):
+    """Разобрать ингредиенты из текста в список"""
+    if not text:
+        return []
+    
+    # Если это строка с Python-списком
+    if text.strip().startswith('[') and text.strip().endswith(']'):
+        try:
+            # Заменяем одиночные кавычки на двойные для корректного JSON
+            ingredients_data = json.loads(text.strip().replace("'", '"'))
+            if isinstance(ingredients_data, list):
+                return ingredients_data
+        except Exception as e:
+            print(f"Ошибка парсинга ингредиентов: {e}")
+    
+    # Если это обычный текст с переносами строк
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+def parse_steps(text):
+    """Разобрать шаги из текста в список"""
+    if not text:
+        return []
+    
+    if text.strip().startswith('['):
+        try:
+            steps_data = json.loads(text)
+            if isinstance(steps_data, list):
+                return steps_data
+        except:
+            pass
+    
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
 # Модели
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -41,6 +117,8 @@ class Recipe(db.Model):
     category = db.Column(db.String(50))
     image_url = db.Column(db.String(300), default='/static/img/default.jpg')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, index=True)  # версия каталога при последнем изменении
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     
     def to_dict(self):
@@ -59,61 +137,12 @@ class Recipe(db.Model):
         }
     
     def get_ingredients_list(self):
-        """Получить ингредиенты как список (исправленная версия)"""
-        if not self.ingredients:
-            return []
-        
-        # Если это строка с Python-списком
-        if self.ingredients.strip().startswith('[') and self.ingredients.strip().endswith(']'):
-            try:
-                # Убираем лишние кавычки и преобразуем
-                ingredients_str = self.ingredients.strip()
-                # Заменяем одиночные кавычки на двойные для корректного JSON
-                ingredients_str = ingredients_str.replace("'", '"')
-                ingredients_data = json.loads(ingredients_str)
-                if isinstance(ingredients_data, list):
-                    return ingredients_data
-            except Exception as e:
-                print(f"Ошибка парсинга ингредиентов: {e}")
-                pass
-        
-        # Если это обычный текст с переносами строк
-        return [line.strip() for line in self.ingredients.split('\n') if line.strip()]
-    
-    def get_steps_list(self):
-        """Получить шаги как список (исправленная версия)"""
-        if not self.steps:
-            return []
-        
-        # Если это строка с Python-списком
-        if self.steps.strip().startswith('[') and self.steps.strip().endswith(']'):
-            try:
-                steps_str = self.steps.strip()
-                steps_str = steps_str.replace("'", '"')
-                steps_data = json.loads(steps_str)
-                if isinstance(steps_data, list):
-                    return steps_data
-            except Exception as e:
-                print(f"Ошибка парсинга шагов: {e}")
-                pass
-        
-        # Если это обычный текст с переносами строк
-        return [line.strip() for line in self.steps.split('\n') if line.strip()]
+        """Получить ингредиенты как список"""
+        return parse_ingredients(self.ingredients)
     
     def get_steps_list(self):
         """Получить шаги как список"""
-        if not self.steps:
-            return []
-        
-        if self.steps.strip().startswith('['):
-            try:
-                steps_data = json.loads(self.steps)
-                if isinstance(steps_data, list):
-                    return steps_data
-            except:
-                pass
-        
-        return [line.strip() for line in self.steps.split('\n') if line.strip()]
+        return parse_steps(self.steps)
     
     def get_ingredients_text(self):
         """Получить ингредиенты как текст для формы"""
@@ -123,10 +152,313 @@ class Recipe(db.Model):
         """Получить шаги как текст для формы"""
         return self.steps or ''
 
+# Колонки для списков рецептов: читаем кортежи, без создания ORM-объектов.
+# created_at приводим к строке в БД и обрезаем до минут - как в to_dict()
+RECIPE_ROW_COLUMNS = (
+    Recipe.id, Recipe.title, Recipe.description, Recipe.ingredients, Recipe.steps,
+    Recipe.cooking_time, Recipe.difficulty, Recipe.category, Recipe.image_url,
+    db.cast(Recipe.created_at, db.String).label('created_at')
+)
+
+def recipe_rows_to_dicts(query):
+    """Сериализовать рецепты из запроса так же, как Recipe.to_dict(), но по строкам"""
+    return [{
+        'id': row[0],
+        'title': row[1] or '',
+        'description': row[2] or '',
+        'ingredients': parse_ingredients(row[3]),
+        'steps': parse_steps(row[4]),
+        'cooking_time': row[5] or 0,
+        'difficulty': row[6] or '',
+        'category': row[7] or '',
+        'image_url': row[8] or '/static/img/default.jpg',
+        'created_at': row[9][:16] if row[9] else ''
+    } for row in query.with_entities(*RECIPE_ROW_COLUMNS)]
+
+class RecipeTombstone(db.Model):
+    """Отметка об удалённом рецепте для дельта-синхронизации"""
+    recipe_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CatalogState(db.Model):
+    """Монотонно растущая версия каталога рецептов (одна строка)"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Случайный id каталога: по нему клиент узнаёт, что база пересоздана
+    catalog_id = db.Column(db.String(32))
+
+# ========== ВЕРСИИ КАТАЛОГА ==========
+
+def bump_catalog_version():
+    """Увеличить версию каталога и вернуть новое значение.
+    
+    UPDATE берёт блокировку на запись до конца транзакции, поэтому
+    параллельные изменения получают разные версии.
+    """
+    db.session.execute(
+        db.update(CatalogState)
+        .where(CatalogState.id == 1)
+        .values(version=CatalogState.version + 1)
+    )
+    return db.session.execute(
+        db.select(CatalogState.version).where(CatalogState.id == 1)
+    ).scalar_one()
+
+def current_catalog_version():
+    """Текущая версия каталога и его id"""
+    row = db.session.execute(
+        db.select(CatalogState.version, CatalogState.catalog_id).where(CatalogState.id == 1)
+    ).one()
+    return row.version, row.catalog_id
+
+def touch_recipe(recipe):
+    """Пометить рецепт как изменённый в новой версии каталога"""
+    recipe.version = bump_catalog_version()
+    recipe.updated_at = datetime.utcnow()
+
+def record_recipe_deletions(recipe_ids):
+    """Сохранить отметки об удалении рецептов (одна версия на всю пачку)"""
+    if not recipe_ids:
+        return
+    version = bump_catalog_version()
+    for recipe_id in recipe_ids:
+        # id в SQLite может быть переиспользован, поэтому обновляем старую отметку
+        db.session.merge(RecipeTombstone(recipe_id=recipe_id, version=version,
+                                         deleted_at=datetime.utcnow()))
+
+def upgrade_schema():
+    """Добавить новые колонки в уже существующую базу (миграций в проекте нет)"""
+    from sqlalchemy import inspect, text
+    
+    columns = {column['name'] for column in inspect(db.engine).get_columns('recipe')}
+    with db.engine.begin() as conn:
+        if 'updated_at' not in columns:
+            # TIMESTAMP понимают и SQLite, и PostgreSQL (DATETIME - только SQLite)
+            conn.execute(text('ALTER TABLE recipe ADD COLUMN updated_at TIMESTAMP'))
+            conn.execute(text('UPDATE recipe SET updated_at = created_at'))
+        if 'version' not in columns:
+            conn.execute(text('ALTER TABLE recipe ADD COLUMN version INTEGER DEFAULT 0'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_recipe_version ON recipe (version)'))
+    
+    columns = {column['name'] for column in inspect(db.engine).get_columns('catalog_state')}
+    if 'catalog_id' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE catalog_state ADD COLUMN catalog_id VARCHAR(32)'))
+
+# ========== СЧЁТЧИКИ ПОПУЛЯРНОСТИ ==========
+
+# Вклад событий в рейтинг популярности
+VIEW_WEIGHT = 1.0
+SEARCH_HIT_WEIGHT = 0.2
+# Попадание в поиск засчитывается только первым результатам выдачи:
+# иначе короткий запрос вроде "а" добавлял бы очко почти всему каталогу
+SEARCH_HIT_LIMIT = 12
+# Вклад события уменьшается вдвое за неделю
+POPULARITY_HALF_LIFE = 7 * 24 * 3600
+# Начальная эпоха; дальше она хранится в StatsState и сдвигается вперёд,
+# когда множитель доходит до 2^POPULARITY_REBASE_EXPONENT (около года)
+POPULARITY_EPOCH = datetime(2025, 1, 1)
+POPULARITY_REBASE_EXPONENT = 52
+# Строк в одном INSERT (ограничение SQLite на число параметров)
+STATS_BATCH_SIZE = 1000
+
+class RecipeStats(db.Model):
+    """Накопленные просмотры и попадания рецепта в поиск"""
+    recipe_id = db.Column(db.Integer, primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    search_hits = db.Column(db.Integer, nullable=False, default=0)
+    popularity = db.Column(db.Float, nullable=False, default=0, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StatsState(db.Model):
+    """Общая для всех процессов эпоха оценок популярности (одна строка)"""
+    id = db.Column(db.Integer, primary_key=True)
+    popularity_epoch = db.Column(db.DateTime, nullable=False, default=POPULARITY_EPOCH)
+
+def popularity_weight(moment):
+    """Множитель вклада события, произошедшего в момент moment.
+    
+    Вместо того чтобы со временем уменьшать все оценки, увеличиваем вклад
+    новых событий: порядок рецептов тот же, а оценку можно просто
+    прибавлять в UPSERT без пересчёта всей таблицы. Чтобы множитель не
+    переполнил float, время от времени сдвигаем эпоху вперёд и во столько же
+    раз уменьшаем сохранённые оценки.
+    
+    Начинает транзакцию записи: эпоха не может смениться до commit(), так что
+    множитель остаётся верным для UPSERT в той же транзакции.
+    """
+    # SQLite игнорирует FOR UPDATE и не открывает транзакцию перед SELECT,
+    # поэтому сначала пишем в stats_state - это берёт блокировку на запись
+    # (в PostgreSQL - блокировку строки) до конца транзакции
+    db.session.execute(
+        db.update(StatsState)
+        .where(StatsState.id == 1)
+        .values(popularity_epoch=StatsState.popularity_epoch)
+    )
+    epoch = db.session.execute(
+        db.select(StatsState.popularity_epoch).where(StatsState.id == 1)
+    ).scalar_one()
+    exponent = (moment - epoch).total_seconds() / POPULARITY_HALF_LIFE
+    
+    if exponent > POPULARITY_REBASE_EXPONENT:
+        shift = int(exponent)
+        RecipeStats.query.update(
+            {'popularity': RecipeStats.popularity * 2.0 ** -shift},
+            synchronize_session=False
+        )
+        db.session.execute(
+            db.update(StatsState)
+            .where(StatsState.id == 1)
+            .values(popularity_epoch=epoch + timedelta(seconds=shift * POPULARITY_HALF_LIFE))
+        )
+        exponent -= shift
+    
+    return 2 ** exponent
+
+def write_recipe_stats(counts):
+    """Записать накопленные счётчики {recipe_id: [views, search_hits]} одной транзакцией"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    
+    now = datetime.utcnow()
+    weight = popularity_weight(now)
+    recipe_ids = list(counts)
+    
+    for start in range(0, len(recipe_ids), STATS_BATCH_SIZE):
+        batch = recipe_ids[start:start + STATS_BATCH_SIZE]
+        # Пропускаем рецепты, удалённые после подсчёта: SQLite переиспользует
+        # id, и их просмотры достались бы новому рецепту
+        existing = {recipe_id for (recipe_id,) in
+                    Recipe.query.with_entities(Recipe.id).filter(Recipe.id.in_(batch))}
+        rows = [{
+            'recipe_id': recipe_id,
+            'views': counts[recipe_id][0],
+            'search_hits': counts[recipe_id][1],
+            'popularity': (counts[recipe_id][0] * VIEW_WEIGHT +
+                           counts[recipe_id][1] * SEARCH_HIT_WEIGHT) * weight,
+            'updated_at': now
+        } for recipe_id in batch if recipe_id in existing]
+        if not rows:
+            continue
+        
+        stmt = insert(RecipeStats).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RecipeStats.recipe_id],
+            set_={
+                'views': RecipeStats.views + stmt.excluded.views,
+                'search_hits': RecipeStats.search_hits + stmt.excluded.search_hits,
+                'popularity': RecipeStats.popularity + stmt.excluded.popularity,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        db.session.execute(stmt)
+    db.session.commit()
+
+class StatsCounter:
+    """Счётчики просмотров в памяти процесса.
+    
+    Запросы только увеличивают числа в словаре, а фоновый поток раз в
+    interval секунд записывает их в БД, так что чтение рецепта не
+    превращается в запись и не ждёт блокировку SQLite.
+    """
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self._counts = {}  # recipe_id -> [views, search_hits]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+    
+    def record_view(self, recipe_id):
+        self._add([recipe_id], 0)
+    
+    def record_search_hits(self, recipe_ids):
+        self._add(recipe_ids, 1)
+    
+    def discard(self, recipe_ids):
+        """Забыть ещё не записанные счётчики удалённых рецептов"""
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._counts.pop(recipe_id, None)
+    
+    def _add(self, recipe_ids, field):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._counts.setdefault(recipe_id, [0, 0])[field] += 1
+            # Поток запускаем при первом событии, а не при импорте модуля
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stats-flush', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ошибка записи статистики: {e}")
+    
+    def flush(self):
+        """Записать накопленное в БД; возвращает число обновлённых рецептов"""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._counts = self._counts, {}
+            if not counts:
+                return 0
+            
+            try:
+                with app.app_context():
+                    write_recipe_stats(counts)
+            except Exception:
+                # Возвращаем счётчики, чтобы записать их при следующей попытке
+                with self._lock:
+                    for recipe_id, (views, search_hits) in counts.items():
+                        pending = self._counts.setdefault(recipe_id, [0, 0])
+                        pending[0] += views
+                        pending[1] += search_hits
+                raise
+            return len(counts)
+
+stats_counter = StatsCounter(app.config['STATS_FLUSH_INTERVAL'])
+
+@atexit.register
+def flush_stats_on_exit():
+    """Финальная запись счётчиков при остановке процесса"""
+    try:
+        stats_counter.flush()
+    except Exception as e:
+        print(f"Ошибка записи статистики при остановке: {e}")
+
+def sorted_recipe_dicts(query, sort):
+    """Рецепты из запроса в виде словарей: сначала новые (по умолчанию) или популярные.
+    
+    Популярные читаются из recipe_stats по индексу popularity, без сортировки
+    всего каталога; рецепты без статистики идут следом, начиная с новых.
+    """
+    if sort != 'popular':
+        return recipe_rows_to_dicts(query.order_by(Recipe.created_at.desc()))
+    
+    # Сначала рецепты без статистики: если запись успеет появиться между
+    # запросами, рецепт попадёт в оба списка, а не пропадёт из ответа
+    unranked = recipe_rows_to_dicts(
+        query.filter(~db.exists().where(RecipeStats.recipe_id == Recipe.id))
+        .order_by(Recipe.created_at.desc())
+    )
+    ranked = recipe_rows_to_dicts(
+        query.join(RecipeStats, RecipeStats.recipe_id == Recipe.id)
+        .order_by(RecipeStats.popularity.desc(), RecipeStats.recipe_id.desc())
+    )
+    ranked_ids = {r['id'] for r in ranked}
+    return ranked + [r for r in unranked if r['id'] not in ranked_ids]
+
 # Инициализация базы данных с тестовыми данными
 def init_database():
     with app.app_context():
         db.create_all()
+        upgrade_schema()
         
         admin = User.query.filter_by(username='admin').first()
         if not admin:
@@ -136,6 +468,14 @@ def init_database():
             db.session.commit()
             print("✅ Администратор создан: admin / Admin123!")
         
+        state = db.session.get(CatalogState, 1)
+        if not state:
+            state = CatalogState(id=1, version=0)
+            db.session.add(state)
+        if not state.catalog_id:
+            state.catalog_id = uuid.uuid4().hex
+        db.session.commit()
+        
         if Recipe.query.count() == 0:
             sample_recipes = [
                 {
@@ -169,10 +509,21 @@ def init_database():
                     category=recipe_data['category'],
                     user_id=admin.id
                 )
+                touch_recipe(recipe)
                 db.session.add(recipe)
             
             db.session.commit()
             print(f"✅ Добавлено {len(sample_recipes)} тестовых рецептов")
+        
+        # Рецепты без версии (база до дельта-синхронизации) получают новую версию.
+        # Версия 0 означает "полный снимок", поэтому каталог начинается с 1
+        unversioned = Recipe.query.filter(db.or_(Recipe.version.is_(None), Recipe.version == 0))
+        if unversioned.count() or current_catalog_version()[0] == 0:
+            unversioned.update({'version': bump_catalog_version()}, synchronize_session=False)
+        
+        if not db.session.get(StatsState, 1):
+            db.session.add(StatsState(id=1, popularity_epoch=POPULARITY_EPOCH))
+        db.session.commit()
 
 # ========== РОУТЫ ДЛЯ ВСЕХ ПОЛЬЗОВАТЕЛЕЙ ==========
 
@@ -231,16 +582,73 @@ def edit_recipe_page(recipe_id):
 
 # ========== API ДЛЯ УПРАВЛЕНИЯ РЕЦЕПТАМИ ==========
 
-# Получить все рецепты
+# Максимум id в одном запросе /api/recipes?ids=...
+MAX_RECIPE_IDS = 100
+MAX_RECIPE_ID = 2 ** 63 - 1
+
+# Получить все рецепты или несколько по id (?ids=1,2,3)
 @app.route('/api/recipes')
 def get_all_recipes():
-    recipes = Recipe.query.order_by(Recipe.created_at.desc()).all()
-    return jsonify({'recipes': [r.to_dict() for r in recipes]})
+    ids_param = request.args.get('ids', '').strip()
+    if not ids_param:
+        sort = request.args.get('sort', '').strip()
+        recipes = sorted_recipe_dicts(Recipe.query, sort)
+        return jsonify({'recipes': recipes})
+    
+    # Только десятичные цифры ASCII: int() принял бы и "+1", "1_0" или "١"
+    tokens = [i.strip() for i in ids_param.split(',') if i.strip()]
+    if not all(i.isascii() and i.isdigit() for i in tokens):
+        return jsonify({'error': 'Параметр ids должен содержать числа через запятую'}), 400
+    ids = list(dict.fromkeys(int(i) for i in tokens))
+    # id - положительные числа, влезающие в INTEGER (64 бита)
+    if not ids or not all(0 < i <= MAX_RECIPE_ID for i in ids):
+        return jsonify({'error': 'Параметр ids должен содержать числа через запятую'}), 400
+    
+    if len(ids) > MAX_RECIPE_IDS:
+        return jsonify({'error': f'Можно запросить не больше {MAX_RECIPE_IDS} рецептов'}), 400
+    
+    # Возвращаем в порядке запроса, отсутствующие id перечисляем отдельно
+    found = {r['id']: r for r in recipe_rows_to_dicts(Recipe.query.filter(Recipe.id.in_(ids)))}
+    return jsonify({
+        'recipes': [found[i] for i in ids if i in found],
+        'missing': [i for i in ids if i not in found]
+    })
+
+# Изменения каталога после указанной версии (для локального кэша на клиенте)
+@app.route('/api/recipes/changes')
+def get_recipe_changes():
+    since = request.args.get('since', 0, type=int)
+    # Версию читаем до выборки: изменения, попавшие между запросами,
+    # клиент просто получит ещё раз при следующей синхронизации
+    version, catalog_id = current_catalog_version()
+    
+    # since=0, другой каталог (база пересоздана) или версия из будущего - полный снимок
+    if since <= 0 or since > version or request.args.get('catalog') != catalog_id:
+        return jsonify({
+            'version': version,
+            'catalog': catalog_id,
+            'full': True,
+            'recipes': recipe_rows_to_dicts(Recipe.query.order_by(Recipe.created_at.desc())),
+            'deleted': []
+        })
+    
+    recipes = recipe_rows_to_dicts(Recipe.query.filter(Recipe.version > since))
+    changed_ids = {r['id'] for r in recipes}
+    tombstones = RecipeTombstone.query.filter(RecipeTombstone.version > since).all()
+    
+    return jsonify({
+        'version': version,
+        'catalog': catalog_id,
+        'full': False,
+        'recipes': recipes,
+        'deleted': [t.recipe_id for t in tombstones if t.recipe_id not in changed_ids]
+    })
 
 # Получить один рецепт
 @app.route('/api/recipes/<int:recipe_id>')
 def get_recipe(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
+    stats_counter.record_view(recipe.id)
     return jsonify({'recipe': recipe.to_dict()})
 
 # Добавить рецепт (только админ)
@@ -298,6 +706,7 @@ def api_add_recipe():
             image_url=data.get('image_url', '/static/img/default.jpg'),
             user_id=session['user_id']
         )
+        touch_recipe(recipe)
         
         db.session.add(recipe)
         db.session.commit()
@@ -360,6 +769,7 @@ def api_update_recipe_by_id(recipe_id):
         if 'image_url' in data:
             recipe.image_url = data['image_url']
         
+        touch_recipe(recipe)
         db.session.commit()
         
         return jsonify({
@@ -383,8 +793,11 @@ def api_delete_recipe_by_id(recipe_id):
     recipe = Recipe.query.get_or_404(recipe_id)
     title = recipe.title
     
+    record_recipe_deletions([recipe.id])
+    RecipeStats.query.filter_by(recipe_id=recipe.id).delete()
     db.session.delete(recipe)
     db.session.commit()
+    stats_counter.discard([recipe_id])
     
     return jsonify({
         'message': f'Рецепт "{title}" успешно удален!'
@@ -407,6 +820,7 @@ def perform_search():
     category = request.args.get('category', '').strip()
     difficulty = request.args.get('difficulty', '').strip()
     time = request.args.get('time', '').strip()
+    sort = request.args.get('sort', '').strip()
     
     recipes_query = Recipe.query
     
@@ -452,10 +866,15 @@ def perform_search():
         except ValueError:
             pass
     
-    recipes = recipes_query.order_by(Recipe.created_at.desc()).all()
+    recipes = sorted_recipe_dicts(recipes_query, sort)
+    
+    # Попадание в поиск считаем только для запросов с текстом или ингредиентами
+    # и только для первых SEARCH_HIT_LIMIT результатов
+    if query or ingredients:
+        stats_counter.record_search_hits([r['id'] for r in recipes[:SEARCH_HIT_LIMIT]])
     
     return jsonify({
-        'recipes': [r.to_dict() for r in recipes],
+        'recipes': recipes,
         'count': len(recipes)
     })
 
@@ -522,9 +941,15 @@ def api_delete_account():
     if user.is_admin:
         return jsonify({'error': 'Нельзя удалить администратора'}), 403
     
+    recipe_ids = [recipe_id for (recipe_id,) in
+                  Recipe.query.with_entities(Recipe.id).filter_by(user_id=user.id)]
+    record_recipe_deletions(recipe_ids)
+    if recipe_ids:
+        RecipeStats.query.filter(RecipeStats.recipe_id.in_(recipe_ids)).delete()
     Recipe.query.filter_by(user_id=user.id).delete()
     db.session.delete(user)
     db.session.commit()
+    stats_counter.discard(recipe_ids)
     
     session.clear()
     return jsonify({'message': 'Аккаунт удален!'})
@@ -0,0 +1,254 @@
+"""Тесты API через тестовый клиент Flask: python -m pytest -q"""
+import os
+import tempfile
+
+# Отдельная база для тестов; задаётся до импорта приложения
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['STATS_FLUSH_INTERVAL'] = '3600'
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import app as app_module
+from app import app, db, stats_counter
+
+
+@pytest.fixture
+def client():
+    with app.app_context():
+        db.drop_all()
+    stats_counter._counts.clear()
+    restart()
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(client):
+    client.post('/api/login', json={'username': 'admin', 'password': 'Admin123!'})
+    return client
+
+
+def restart():
+    """Как перезапуск процесса: init_database() выполнится при следующем запросе"""
+    if hasattr(app, 'db_initialized'):
+        del app.db_initialized
+
+
+def add_recipe(client, title='Тестовый рецепт'):
+    response = client.post('/api/recipes', json={
+        'title': title,
+        'ingredients': ['мука', 'молоко'],
+        'steps': ['Смешать', 'Пожарить'],
+        'cooking_time': 10
+    })
+    assert response.status_code == 201
+    return response.json['recipe']['id']
+
+
+def sync(client, since=0, catalog=''):
+    response = client.get(f'/api/recipes/changes?since={since}&catalog={catalog}')
+    assert response.status_code == 200
+    return response.json
+
+
+# ========== ДЕЛЬТА-СИНХРОНИЗАЦИЯ ==========
+
+def test_first_snapshot_has_nonzero_version(client):
+    snapshot = sync(client)
+    assert snapshot['full'] is True
+    assert snapshot['version'] > 0
+    assert len(snapshot['recipes']) == 2
+
+    delta = sync(client, snapshot['version'], snapshot['catalog'])
+    assert delta['full'] is False
+    assert delta['recipes'] == [] and delta['deleted'] == []
+
+
+def test_delta_contains_added_updated_and_deleted(admin):
+    snapshot = sync(admin)
+    new_id = add_recipe(admin)
+
+    delta = sync(admin, snapshot['version'], snapshot['catalog'])
+    assert [r['id'] for r in delta['recipes']] == [new_id]
+    assert delta['version'] > snapshot['version']
+
+    admin.put(f'/api/recipes/{new_id}/update', json={'title': 'Новое название'})
+    after_update = sync(admin, delta['version'], delta['catalog'])
+    assert [r['title'] for r in after_update['recipes']] == ['Новое название']
+
+    admin.delete(f'/api/recipes/{new_id}/delete')
+    after_delete = sync(admin, after_update['version'], after_update['catalog'])
+    assert after_delete['recipes'] == []
+    assert after_delete['deleted'] == [new_id]
+
+
+def test_reseeded_recipes_reach_synced_clients(admin):
+    snapshot = sync(admin)
+    for recipe in snapshot['recipes']:
+        admin.delete(f"/api/recipes/{recipe['id']}/delete")
+    after_delete = sync(admin, snapshot['version'], snapshot['catalog'])
+
+    restart()  # пустой каталог заполняется заново
+    for since in (snapshot['version'], after_delete['version']):
+        delta = sync(admin, since, snapshot['catalog'])
+        assert delta['full'] is False
+        assert len(delta['recipes']) == 2
+        assert delta['deleted'] == []
+
+
+def test_recreated_database_gets_full_snapshot(admin):
+    snapshot = sync(admin)
+
+    with app.app_context():
+        db.drop_all()
+    restart()
+    admin.post('/api/login', json={'username': 'admin', 'password': 'Admin123!'})
+    for i in range(snapshot['version'] + 1):
+        add_recipe(admin, f'Рецепт {i}')
+
+    delta = sync(admin, snapshot['version'], snapshot['catalog'])
+    assert delta['version'] > snapshot['version']
+    assert delta['full'] is True
+    assert delta['catalog'] != snapshot['catalog']
+
+
+# ========== СПИСКИ РЕЦЕПТОВ ==========
+
+def test_row_serialization_matches_to_dict(admin):
+    from app import Recipe, recipe_rows_to_dicts
+
+    add_recipe(admin)
+    with app.app_context():
+        db.session.add(Recipe(title='Старый формат', ingredients="['мука', 'яйца']",
+                              steps='["Смешать", "Испечь"]', cooking_time=None))
+        db.session.commit()
+
+        query = Recipe.query.order_by(Recipe.created_at.desc())
+        assert recipe_rows_to_dicts(query) == [r.to_dict() for r in query.all()]
+
+
+def test_multi_get_keeps_request_order(client):
+    response = client.get('/api/recipes?ids=2,1,999,2')
+    assert response.status_code == 200
+    assert [r['id'] for r in response.json['recipes']] == [2, 1]
+    assert response.json['missing'] == [999]
+
+
+@pytest.mark.parametrize('ids', [
+    '', ',', 'x', '1,x', '0', '-3', '+1', '1_0', '١', '1.5',
+    '99999999999999999999999', ','.join(str(i) for i in range(1, 102)),
+])
+def test_multi_get_rejects_bad_ids(client, ids):
+    response = client.get('/api/recipes', query_string={'ids': ids})
+    if ids:
+        assert response.status_code == 400
+    else:
+        # пустой ids - обычный список всех рецептов
+        assert response.status_code == 200 and 'missing' not in response.json
+
+
+# ========== ПОПУЛЯРНОСТЬ ==========
+
+def stats():
+    from app import RecipeStats
+
+    with app.app_context():
+        return {s.recipe_id: (s.views, s.search_hits) for s in RecipeStats.query.all()}
+
+
+def test_flush_and_popular_sort(client):
+    client.get('/api/recipes/1')
+    client.get('/api/recipes/1')
+    assert stats() == {}  # до записи счётчики только в памяти
+
+    assert stats_counter.flush() == 1
+    assert stats() == {1: (2, 0)}
+
+    ids = [r['id'] for r in client.get('/api/recipes?sort=popular').json['recipes']]
+    assert ids == [1, 2]
+    ids = [r['id'] for r in client.get('/api/search?sort=popular').json['recipes']]
+    assert ids == [1, 2]
+
+
+def test_failed_flush_keeps_counts(client, monkeypatch):
+    client.get('/api/recipes/2')
+
+    def fail(counts):
+        raise RuntimeError('база недоступна')
+
+    monkeypatch.setattr(app_module, 'write_recipe_stats', fail)
+    with pytest.raises(RuntimeError):
+        stats_counter.flush()
+
+    monkeypatch.undo()
+    assert stats_counter.flush() == 1
+    assert stats() == {2: (1, 0)}
+
+
+def test_deleted_recipe_does_not_pass_views_to_reused_id(admin):
+    recipe_id = add_recipe(admin)
+    admin.get(f'/api/recipes/{recipe_id}')
+    admin.delete(f'/api/recipes/{recipe_id}/delete')
+    stats_counter.flush()
+    assert stats() == {}
+
+    # Запись, уже забранная потоком до удаления, тоже пропускается
+    with app.app_context():
+        app_module.write_recipe_stats({recipe_id: [5, 0]})
+    assert stats() == {}
+
+    assert add_recipe(admin, 'Новый') == recipe_id
+    assert admin.get('/api/recipes?sort=popular').json['recipes'][0]['title'] == 'Новый'
+
+
+def test_search_hits_credit_only_top_results(admin):
+    for i in range(app_module.SEARCH_HIT_LIMIT + 5):
+        add_recipe(admin, f'Суп {i}')
+    stats_counter.flush()
+
+    admin.get('/api/search?q=Суп')
+    stats_counter.flush()
+    assert sum(hits for _, hits in stats().values()) == app_module.SEARCH_HIT_LIMIT
+
+
+def test_epoch_rebase_keeps_scores_finite(client):
+    from app import StatsState
+
+    client.get('/api/recipes/1')
+    stats_counter.flush()
+    with app.app_context():
+        db.session.get(StatsState, 1).popularity_epoch = datetime(1990, 1, 1)
+        db.session.commit()
+
+    client.get('/api/recipes/2')
+    client.get('/api/recipes/2')
+    stats_counter.flush()
+
+    with app.app_context():
+        epoch = db.session.get(StatsState, 1).popularity_epoch
+    assert epoch > datetime.utcnow().replace(year=datetime.utcnow().year - 1)
+    assert [r['id'] for r in client.get('/api/recipes?sort=popular').json['recipes']] == [2, 1]
+
+
+def test_popularity_weight_holds_write_lock(client):
+    from app import StatsState
+
+    client.get('/api/recipes')
+    path = os.environ['DATABASE_URL'][len('sqlite:///'):]
+
+    with app.app_context():
+        # Свежая эпоха, чтобы не было сдвига: его UPDATE сам взял бы блокировку
+        db.session.get(StatsState, 1).popularity_epoch = datetime.utcnow()
+        db.session.commit()
+
+        app_module.popularity_weight(datetime.utcnow())
+        other = sqlite3.connect(path, timeout=0)
+        try:
+            # Пока транзакция не завершена, другой процесс не может сменить эпоху
+            with pytest.raises(sqlite3.OperationalError, match='locked'):
+                other.execute('UPDATE stats_state SET popularity_epoch = popularity_epoch')
+        finally:
+            other.close()
+            db.session.rollback()